@@ -1,6 +1,8 @@
-import copy
 import dataclasses
 import logging
+import os
+import platform
+import shutil
 from typing import Any, ClassVar
 
 import casadi as cs
@@ -25,6 +27,43 @@ from hippopt.base.problem import Problem
 from hippopt.base.variable import Variable
 
 
+def _clone_value(value: Any) -> Any:
+    if isinstance(value, OptimizationObject):
+        return _fast_clone(value)
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    if isinstance(value, cs.DM):
+        return cs.DM(value)
+    if isinstance(value, list):
+        return [_clone_value(elem) for elem in value]
+    if isinstance(value, dict):
+        return {key: _clone_value(inner) for key, inner in value.items()}
+    return value
+
+
+def _fast_clone(
+    input_structure: TOptimizationObject | list[TOptimizationObject],
+) -> TOptimizationObject | list[TOptimizationObject]:
+    # Ad-hoc replacement of copy.deepcopy exploiting the fact that the
+    # optimization structures are dataclasses whose leaf values are either
+    # arrays, casadi objects (that are not meant to be edited in place),
+    # or plain immutable values.
+    if isinstance(input_structure, list):
+        output = input_structure.__class__.__new__(input_structure.__class__)
+        output.extend(_clone_value(elem) for elem in input_structure)
+        # List subclasses (e.g. FootContactState) are dataclasses too and
+        # can carry fields on top of the list content.
+        if type(input_structure) is not list:
+            for name, value in vars(input_structure).items():
+                setattr(output, name, _clone_value(value))
+        return output
+
+    output = input_structure.__class__.__new__(input_structure.__class__)
+    for name, value in vars(input_structure).items():
+        setattr(output, name, _clone_value(value))
+    return output
+
+
 class OptiFailure(Exception):
     def __init__(self, message: Exception, callback_used: bool):
         callback_info = ""
@@ -72,6 +111,15 @@ class OptiSolver(OptimizationSolver):
     callback_save_constraint_multipliers: dataclasses.InitVar[bool] = dataclasses.field(
         default=None
     )
+    _jit: bool = dataclasses.field(default=False)
+    _jit_flags: list[str] = dataclasses.field(default=None)
+    _jit_cache_dir: str = dataclasses.field(default=None)
+    jit: dataclasses.InitVar[bool] = dataclasses.field(default=None)
+    jit_flags: dataclasses.InitVar[list[str]] = dataclasses.field(default=None)
+    jit_cache_dir: dataclasses.InitVar[str] = dataclasses.field(default=None)
+    _expand: bool = dataclasses.field(default=True)
+    expand: dataclasses.InitVar[bool] = dataclasses.field(default=None)
+    _problem_type: str = dataclasses.field(default="nlp")
 
     _cost: cs.MX = dataclasses.field(default=None)
     _cost_expressions: dict[str, cs.MX] = dataclasses.field(default=None)
@@ -98,6 +146,10 @@ class OptiSolver(OptimizationSolver):
     _free_parameters: list[str] = dataclasses.field(default=None)
     _parameters_map: dict[cs.MX, str] = dataclasses.field(default=None)
     _variables_map: dict[cs.MX, str] = dataclasses.field(default=None)
+    _stacked_objects: cs.MX = dataclasses.field(default=None)
+    _stacked_objects_slices: list[tuple[str, int, tuple[int, int]]] = dataclasses.field(
+        default=None
+    )
     _logger: logging.Logger = dataclasses.field(default=None)
 
     def __post_init__(
@@ -109,8 +161,13 @@ class OptiSolver(OptimizationSolver):
         callback_criterion: CallbackCriterion = None,
         callback_save_costs: bool = True,
         callback_save_constraint_multipliers: bool = True,
+        jit: bool = False,
+        jit_flags: list[str] = None,
+        jit_cache_dir: str = None,
+        expand: bool = True,
     ):
         self._solver = cs.Opti(problem_type)
+        self._problem_type = problem_type
         self._inner_solver = (
             inner_solver if inner_solver is not None else self.DefaultSolverType
         )
@@ -120,6 +177,12 @@ class OptiSolver(OptimizationSolver):
         self._options_plugin = (
             options_plugin if isinstance(options_plugin, dict) else {}
         )
+        self._jit = jit if jit is not None else False
+        self._jit_flags = jit_flags
+        self._jit_cache_dir = jit_cache_dir
+        self._expand = expand if expand is not None else True
+        self._apply_jit_options()
+        self._apply_expand_option()
         self._solver.solver(
             self._inner_solver, self._options_plugin, self._options_solver
         )
@@ -136,6 +199,44 @@ class OptiSolver(OptimizationSolver):
         self._variables_map = {}
         self._logger = logging.getLogger("[hippopt::OptiSolver]")
 
+    def _apply_jit_options(self) -> None:
+        if not self._jit:
+            return
+
+        # The compiled code is cached through ccache (if available), so that
+        # repeated runs of the same problem skip the compilation.
+        compiler = "cl.exe" if platform.system() == "Windows" else "gcc"
+        if shutil.which("ccache") is not None:
+            compiler = "ccache " + compiler
+
+        jit_options = {
+            "flags": self._jit_flags if self._jit_flags else ["-O3"],
+            "compiler": compiler,
+            "verbose": False,
+        }
+
+        self._options_plugin.setdefault("jit", True)
+        self._options_plugin.setdefault("compiler", "shell")
+
+        if self._jit_cache_dir is not None:
+            # Keep the generated sources and shared objects in the given
+            # directory, so that across runs the compiler cache can
+            # short-circuit the compilation of an unchanged problem.
+            os.makedirs(self._jit_cache_dir, exist_ok=True)
+            jit_options["directory"] = os.path.join(self._jit_cache_dir, "")
+            self._options_plugin.setdefault("jit_temp_suffix", False)
+            self._options_plugin.setdefault("jit_cleanup", False)
+
+        self._options_plugin.setdefault("jit_options", jit_options)
+
+    def _apply_expand_option(self) -> None:
+        # The expand option converts the MX graph to SX before passing it to
+        # the solver, usually resulting in faster function evaluations at the
+        # cost of a longer setup. It is not supported when the problem embeds
+        # external functions: use expand=False in that case.
+        if self._problem_type == "nlp":
+            self._options_plugin.setdefault("expand", self._expand)
+
     def _generate_opti_object(
         self, storage_type: str, name: str, value: StorageType
     ) -> cs.MX:
@@ -148,25 +249,29 @@ class OptiSolver(OptimizationSolver):
                 f"(it is a {str(type(value))})."
             )
 
-        if value.ndim != 2:
+        # The values are already normalized to 2D arrays when flattening the
+        # input structure, so the shape can be used as is.
+        shape = value.shape
+        if len(shape) != 2:
             raise ValueError(
                 f"Field {name} has number of dimensions different from 2 "
                 f"(input: {value.ndim})."
             )
 
-        if value.shape[0] * value.shape[1] == 0:
+        rows, cols = shape
+        if rows * cols == 0:
             raise ValueError("Field " + name + " has a zero dimension.")
 
-        if storage_type is Variable.StorageTypeValue:
+        if storage_type == Variable.StorageTypeValue:
             self._logger.debug("Creating variable " + name)
-            opti_object = self._solver.variable(*value.shape)
+            opti_object = self._solver.variable(rows, cols)
             self._objects_type_map[opti_object] = Variable.StorageTypeValue
             self._variables_map[opti_object] = name
             return opti_object
 
-        if storage_type is Parameter.StorageTypeValue:
+        if storage_type == Parameter.StorageTypeValue:
             self._logger.debug("Creating parameter " + name)
-            opti_object = self._solver.parameter(*value.shape)
+            opti_object = self._solver.parameter(rows, cols)
             self._objects_type_map[opti_object] = Parameter.StorageTypeValue
             self._free_parameters.append(name)
             self._parameters_map[opti_object] = name
@@ -194,6 +299,37 @@ class OptiSolver(OptimizationSolver):
             return value.full().flatten()
         return value
 
+    def _get_stacked_opti_solution(
+        self, input_solution: cs.OptiSol
+    ) -> dict[str, StorageType]:
+        if self._stacked_objects is None:
+            # The stacked expression and the corresponding slices depend only
+            # on the problem structure, hence they are cached across solves.
+            objects_map = self._variables_map | self._parameters_map
+            self._stacked_objects = cs.vertcat(
+                *[cs.reshape(obj, obj.numel(), 1) for obj in objects_map]
+            )
+            self._stacked_objects_slices = [
+                (objects_map[obj], obj.numel(), obj.shape) for obj in objects_map
+            ]
+
+        flat = np.array(input_solution.value(self._stacked_objects)).flatten()
+
+        output_dict = {}
+        offset = 0
+        for name, numel, shape in self._stacked_objects_slices:
+            chunk = flat[offset : offset + numel]
+            # Match the shapes returned by Opti.value: a float for scalars,
+            # a 1-D array for vectors and a 2-D array for matrices.
+            if numel == 1:
+                output_dict[name] = float(chunk[0])
+            elif min(shape) == 1:
+                output_dict[name] = chunk
+            else:
+                output_dict[name] = np.reshape(chunk, shape, order="F")
+            offset += numel
+        return output_dict
+
     def _generate_solution_output(
         self,
         variables: (
@@ -203,50 +339,62 @@ class OptiSolver(OptimizationSolver):
         ),
         input_solution: cs.OptiSol | dict,
     ) -> TOptimizationObject | list[TOptimizationObject]:
-        output = copy.deepcopy(variables)
+        output = _fast_clone(variables)
         is_list = isinstance(output, list)
 
-        # Get the values from the opti solution
-        output_dict = {}
-        for variable in self._variables_map:
-            output_dict[self._variables_map[variable]] = self._get_opti_solution(
-                variable, input_solution
-            )
+        # Get the values from the opti solution. A single value call on the
+        # stacked objects avoids crossing the casadi boundary once per object.
+        output_dict = None
+        if not isinstance(input_solution, dict):
+            try:
+                output_dict = self._get_stacked_opti_solution(input_solution)
+            except Exception as err:  # noqa
+                self._logger.debug(
+                    "Failed to extract the solution from the stacked objects."
+                    " Falling back to the per-object extraction. Message: " + str(err)
+                )
 
-        for parameter in self._parameters_map:
-            output_dict[self._parameters_map[parameter]] = self._get_opti_solution(
-                parameter, input_solution
-            )
+        if output_dict is None:
+            output_dict = {}
+            for variable in self._variables_map:
+                output_dict[self._variables_map[variable]] = self._get_opti_solution(
+                    variable, input_solution
+                )
+
+            for parameter in self._parameters_map:
+                output_dict[self._parameters_map[parameter]] = self._get_opti_solution(
+                    parameter, input_solution
+                )
 
         # Convert the dict to the output structure
         if is_list:
-            for i in range(len(output)):
-                output[i].from_dict(input_dict=output_dict, prefix=f"[{str(i)}].")
+            for i, elem in enumerate(output):
+                elem.from_dict(input_dict=output_dict, prefix=f"[{str(i)}].")
         else:
             assert isinstance(output, OptimizationObject)
             output.from_dict(input_dict=output_dict)
 
         return output
 
-    def _set_opti_guess(self, variable: cs.MX, value: np.ndarray) -> None:
-        match self._objects_type_map[variable]:
-            case Variable.StorageTypeValue:
-                self._logger.debug(
-                    "Setting initial value for variable "
-                    + self._variables_map[variable]
-                )
-                self._solver.set_initial(variable, value)
-            case Parameter.StorageTypeValue:
-                self._logger.debug(
-                    "Setting initial value for parameter "
-                    + self._parameters_map[variable]
-                )
-                self._solver.set_value(variable, value)
-                parameter_name = self._parameters_map[variable]
-                if parameter_name in self._free_parameters:
-                    self._free_parameters.remove(parameter_name)
-
-        return
+    def _set_opti_guesses(
+        self,
+        variables: list[cs.MX],
+        variable_guesses: list[np.ndarray],
+        parameters: list[cs.MX],
+        parameter_guesses: list[np.ndarray],
+    ) -> None:
+        # A single set_initial/set_value call on the stacked objects avoids
+        # crossing the casadi boundary once per object.
+        if len(variables):
+            self._solver.set_initial(
+                cs.vertcat(*[cs.reshape(v, v.numel(), 1) for v in variables]),
+                np.concatenate(variable_guesses),
+            )
+        if len(parameters):
+            self._solver.set_value(
+                cs.vertcat(*[cs.reshape(p, p.numel(), 1) for p in parameters]),
+                np.concatenate(parameter_guesses),
+            )
 
     def generate_optimization_objects(
         self, input_structure: TOptimizationObject | list[TOptimizationObject], **kwargs
@@ -257,8 +405,10 @@ class OptiSolver(OptimizationSolver):
             raise ValueError(
                 "The input structure is neither an optimization object nor a list."
             )
-        self._objects_structure = copy.deepcopy(input_structure)
-        output = copy.deepcopy(input_structure)
+        self._objects_structure = _fast_clone(input_structure)
+        self._stacked_objects = None
+        self._stacked_objects_slices = None
+        output = _fast_clone(input_structure)
         is_list = isinstance(output, list)
         input_list = output if is_list else [output]
         input_as_dict = {}
@@ -311,8 +461,8 @@ class OptiSolver(OptimizationSolver):
 
         # Convert the dict to the output structure
         if is_list:
-            for i in range(len(output)):
-                output[i].from_dict(input_dict=output_dict, prefix=f"[{str(i)}].")
+            for i, elem in enumerate(output):
+                elem.from_dict(input_dict=output_dict, prefix=f"[{str(i)}].")
         else:
             assert isinstance(output, OptimizationObject)
             output.from_dict(input_dict=output_dict)
@@ -376,6 +526,11 @@ class OptiSolver(OptimizationSolver):
             elem_dict = elem.to_dict(prefix=prefix)
             guess_as_dict.update(elem_dict)
 
+        variables = []
+        variable_guesses = []
+        parameters = []
+        parameter_guesses = []
+
         for obj_name in guess_as_dict:
             guess_value = guess_as_dict[obj_name]
             if guess_value is None:
@@ -414,15 +569,35 @@ class OptiSolver(OptimizationSolver):
                     f"({obj_name.shape})."
                 )
 
-            self._set_opti_guess(
-                variable=corresponding_object,
-                value=guess_value,
+            flat_guess = np.reshape(
+                np.array(guess_value, dtype=float), (-1, 1), order="F"
             )
 
-        self._guess = copy.deepcopy(initial_guess)
+            match self._objects_type_map[corresponding_object]:
+                case Variable.StorageTypeValue:
+                    self._logger.debug("Setting initial value for variable " + obj_name)
+                    variables.append(corresponding_object)
+                    variable_guesses.append(flat_guess)
+                case Parameter.StorageTypeValue:
+                    self._logger.debug(
+                        "Setting initial value for parameter " + obj_name
+                    )
+                    parameters.append(corresponding_object)
+                    parameter_guesses.append(flat_guess)
+                    if obj_name in self._free_parameters:
+                        self._free_parameters.remove(obj_name)
+
+        self._set_opti_guesses(
+            variables=variables,
+            variable_guesses=variable_guesses,
+            parameters=parameters,
+            parameter_guesses=parameter_guesses,
+        )
+
+        self._guess = _fast_clone(initial_guess)
 
     def get_initial_guess(self) -> TOptimizationObject | list[TOptimizationObject]:
-        return copy.deepcopy(self._guess)
+        return _fast_clone(self._guess)
 
     def set_opti_options(
         self,
@@ -437,6 +612,8 @@ class OptiSolver(OptimizationSolver):
         if options_solver is not None:
             self._options_solver = options_solver
 
+        self._apply_jit_options()
+        self._apply_expand_option()
         self._solver.solver(
             self._inner_solver, self._options_plugin, self._options_solver
         )
@@ -453,9 +630,9 @@ class OptiSolver(OptimizationSolver):
             variables = []
             parameters = []
             for obj in self._objects_type_map:
-                if self._objects_type_map[obj] is Variable.StorageTypeValue:
+                if self._objects_type_map[obj] == Variable.StorageTypeValue:
                     variables.append(obj)
-                elif self._objects_type_map[obj] is Parameter.StorageTypeValue:
+                elif self._objects_type_map[obj] == Parameter.StorageTypeValue:
                     parameters.append(obj)
 
             self._callback = SaveBestUnsolvedVariablesCallback(
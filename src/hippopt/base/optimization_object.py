@@ -1,5 +1,6 @@
 import abc
 import dataclasses
+import functools
 from enum import Enum
 from typing import Any, Callable, ClassVar, Type, TypeVar
 
@@ -17,6 +18,35 @@ class TimeExpansion(Enum):
     Matrix = 1
 
 
+@functools.lru_cache(maxsize=None)
+def _fields_of(cls: type) -> tuple[dataclasses.Field, ...]:
+    # dataclasses.fields returns a fresh tuple at every call. The fields of a
+    # given class do not change, so cache them to avoid repeating the
+    # introspection when recursing on nested structures.
+    return tuple(dataclasses.fields(cls))
+
+
+@functools.lru_cache(maxsize=None)
+def _classified_fields_of(
+    cls: type,
+) -> tuple[tuple[dataclasses.Field, bool, bool, dict | None], ...]:
+    # The metadata of a field is fixed at class definition time, hence the
+    # checks performed on it while scanning can be resolved once per class.
+    # Each entry carries the field together with whether it is a storage
+    # field, whether it can be overridden by a composite parent, and the
+    # composite metadata (None if absent).
+    return tuple(
+        (
+            field,
+            OptimizationObject.StorageTypeField in field.metadata,
+            OptimizationObject.OverrideIfCompositeField in field.metadata
+            and field.metadata[OptimizationObject.OverrideIfCompositeField],
+            field.metadata.get(OptimizationObject.CompositeTypeField),
+        )
+        for field in _fields_of(cls)
+    )
+
+
 @dataclasses.dataclass
 class OptimizationObject(abc.ABC):
     StorageTypeValue: ClassVar[str] = "generic"
@@ -109,16 +139,21 @@ class OptimizationObject(abc.ABC):
             return output_dict, metadata_dict
 
         assert isinstance(input_object, OptimizationObject)
-        for field in dataclasses.fields(input_object):
-            composite_value = input_object.__getattribute__(field.name)
-
+        for (
+            field,
+            is_storage,
+            can_override,
+            composite_metadata,
+        ) in _classified_fields_of(type(input_object)):
+            composite_value = getattr(input_object, field.name)
+
+            # The elements of a list are expected to be homogeneous, so it is
+            # enough to check the first one instead of scanning the full list
+            # at every visit. The recursion still validates every element.
             list_of_optimization_objects = (
                 isinstance(composite_value, list)
                 and len(composite_value) > 0
-                and all(
-                    isinstance(elem, OptimizationObject) or isinstance(elem, list)
-                    for elem in composite_value
-                )
+                and isinstance(composite_value[0], (OptimizationObject, list))
             )
 
             if (
@@ -126,15 +161,7 @@ class OptimizationObject(abc.ABC):
                 or list_of_optimization_objects
             ):
                 new_parent_metadata = parent_metadata
-                has_composite_metadata = (
-                    OptimizationObject.CompositeTypeField in field.metadata
-                    and field.metadata[OptimizationObject.CompositeTypeField]
-                    is not None
-                )
-                if has_composite_metadata:
-                    composite_metadata = field.metadata[
-                        OptimizationObject.CompositeTypeField
-                    ]
+                if composite_metadata is not None:
                     use_old_metadata = (
                         parent_metadata is not None
                         and OptimizationObject.OverrideIfCompositeField
@@ -170,18 +197,14 @@ class OptimizationObject(abc.ABC):
 
                 continue
 
-            if OptimizationObject.StorageTypeField in field.metadata:
-                should_override = (
-                    OptimizationObject.OverrideIfCompositeField in field.metadata
-                    and field.metadata[OptimizationObject.OverrideIfCompositeField]
-                )
+            if is_storage:
                 parent_can_override = (
                     parent_metadata is not None
                     and OptimizationObject.StorageTypeField in parent_metadata
                 )
                 value_metadata = field.metadata.copy()
 
-                if should_override and parent_can_override:
+                if can_override and parent_can_override:
                     value_metadata[OptimizationObject.StorageTypeField] = (
                         parent_metadata[OptimizationObject.StorageTypeField]
                     )
@@ -1,10 +1,10 @@
-import copy
 import dataclasses
 import logging
 import math
 import multiprocessing
 from typing import Callable, TypeVar
 
+import casadi as cs
 import matplotlib.axes
 import matplotlib.pyplot as plt
 import numpy as np
@@ -17,6 +17,10 @@ from hippopt.robot_planning.variables.contacts import (
 )
 
 
+def _complementarity_error(positions: np.ndarray, forces: np.ndarray) -> np.ndarray:
+    return np.multiply(positions, forces)
+
+
 @dataclasses.dataclass
 class ContactPointStatePlotterSettings:
     complementarity_axes: list[matplotlib.axes.Axes] | None = dataclasses.field(
@@ -72,6 +76,14 @@ class ContactPointStatePlotter:
         self._complementarity_fig = None
         self._force_axes = self.settings.force_axes
         self._force_fig = None
+        self._height_function = self.settings.terrain.height_function()
+        self._normal_direction_function = (
+            self.settings.terrain.normal_direction_function()
+        )
+        self._mapped_terrain_functions = {}
+
+    def share_terrain_function_cache(self, other: "ContactPointStatePlotter") -> None:
+        self._mapped_terrain_functions = other._mapped_terrain_functions
 
     def plot_complementarity(
         self,
@@ -79,10 +91,11 @@ class ContactPointStatePlotter:
         time_s: float | list[float] | np.ndarray = None,
         title: str = "Contact Point Complementarity",
     ) -> None:
-        _time_s = copy.deepcopy(time_s)
-        if _time_s is None or isinstance(_time_s, float) or _time_s.size == 1:
-            single_step = _time_s if _time_s is not None else 0.0
-            _time_s = np.linspace(0, len(states) * single_step, len(states))
+        if time_s is None or isinstance(time_s, float) or time_s.size == 1:
+            single_step = float(time_s) if time_s is not None else 0.0
+            _time_s = np.arange(len(states)) * single_step
+        else:
+            _time_s = np.asarray(time_s, dtype=float)
 
         if len(_time_s) != len(states):
             raise ValueError(
@@ -95,12 +108,36 @@ class ContactPointStatePlotter:
             )
             plt.tight_layout()
 
-        height_function = self.settings.terrain.height_function()
-        normal_direction_fun = self.settings.terrain.normal_direction_function()
-
-        positions = np.array([height_function(s.p) for s in states]).flatten()
-        forces = np.array([normal_direction_fun(s.p).T @ s.f for s in states]).flatten()
-        complementarity_error = np.multiply(positions, forces)
+        height_function = self._height_function
+        normal_direction_fun = self._normal_direction_function
+
+        number_of_states = len(states)
+        if (
+            number_of_states
+            and isinstance(height_function, cs.Function)
+            and isinstance(normal_direction_fun, cs.Function)
+        ):
+            # Evaluate the terrain functions on all the states at once,
+            # avoiding a casadi call per timestep. The mapped versions are
+            # cached so that repeated plots with the same horizon do not
+            # rebuild them.
+            if number_of_states not in self._mapped_terrain_functions:
+                self._mapped_terrain_functions[number_of_states] = (
+                    height_function.map(number_of_states),
+                    normal_direction_fun.map(number_of_states),
+                )
+            height_map, normal_map = self._mapped_terrain_functions[number_of_states]
+            points = np.hstack([np.asarray(s.p).reshape(-1, 1) for s in states])
+            point_forces = np.hstack([np.asarray(s.f).reshape(-1, 1) for s in states])
+            positions = np.array(height_map(points)).flatten()
+            normals = np.array(normal_map(points))
+            forces = np.sum(normals * point_forces, axis=0)
+        else:
+            positions = np.array([height_function(s.p) for s in states]).flatten()
+            forces = np.array(
+                [normal_direction_fun(s.p).T @ s.f for s in states]
+            ).flatten()
+        complementarity_error = _complementarity_error(positions, forces)
         self._complementarity_axes[1].plot(_time_s, complementarity_error)
         self._complementarity_axes[1].set_ylabel("Complementarity Error [Nm]")
         self._complementarity_axes[1].set_xlabel("Time [s]")
@@ -127,10 +164,11 @@ class ContactPointStatePlotter:
         time_s: float | list[float] | np.ndarray = None,
         title: str = "Contact Point Forces",
     ) -> None:
-        _time_s = copy.deepcopy(time_s)
-        if _time_s is None or isinstance(_time_s, float) or _time_s.size == 1:
-            single_step = _time_s if _time_s is not None else 0.0
-            _time_s = np.linspace(0, len(states) * single_step, len(states))
+        if time_s is None or isinstance(time_s, float) or time_s.size == 1:
+            single_step = float(time_s) if time_s is not None else 0.0
+            _time_s = np.arange(len(states)) * single_step
+        else:
+            _time_s = np.asarray(time_s, dtype=float)
 
         if len(_time_s) != len(states):
             raise ValueError(
@@ -184,29 +222,31 @@ class FootContactStatePlotter:
             [list[FootContactState], np.ndarray, str, int, TerrainDescriptor], None
         ],
     ) -> multiprocessing.Process | None:
-        _time_s = copy.deepcopy(time_s)
-        _states = copy.deepcopy(states)
-        _terrain = copy.deepcopy(self._settings.terrain)
-        if _time_s is None or isinstance(_time_s, float) or _time_s.size == 1:
-            single_step = _time_s if _time_s is not None else 0.0
-            _time_s = np.linspace(0, len(states) * single_step, len(states))
-
-        if len(_time_s) != len(_states):
+        if time_s is None or isinstance(time_s, float) or time_s.size == 1:
+            single_step = float(time_s) if time_s is not None else 0.0
+            _time_s = np.arange(len(states)) * single_step
+        else:
+            _time_s = np.asarray(time_s, dtype=float)
+
+        if len(_time_s) != len(states):
             raise ValueError(
                 "timestep_s and foot_contact_states have different lengths."
             )
 
-        if len(_states) == 0:
+        if len(states) == 0:
             return None
 
+        # The arguments are serialized when spawning the process, so the
+        # child works on a snapshot taken at start() time and there is no
+        # need to copy them beforehand.
         process = multiprocessing.Process(
             target=plot_function,
             args=(
-                _states,
+                states,
                 _time_s,
                 title,
                 self._settings.number_of_columns,
-                _terrain,
+                self._settings.terrain,
             ),
         )
         process.start()
@@ -252,6 +292,11 @@ class FootContactStatePlotter:
             for row in axes_list
             for el in row
         ]
+        # All the plotters work on the same terrain and the same horizon, so
+        # let them share the cache of mapped terrain functions: only the
+        # first plot pays the construction cost.
+        for plotter in _point_plotters[1:]:
+            plotter.share_terrain_function_cache(_point_plotters[0])
         for i in range(last_plot_column + 1, _number_of_columns):
             axes_list[number_of_rows - 1][i].remove()
 
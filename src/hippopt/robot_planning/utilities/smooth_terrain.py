@@ -1,4 +1,6 @@
 import dataclasses
+import functools
+import math
 from typing import TypeVar
 
 import casadi as cs
@@ -14,6 +16,27 @@ from hippopt.robot_planning.utilities.terrain_visualizer import (
 TSmoothTerrain = TypeVar("TSmoothTerrain", bound="SmoothTerrain")
 
 
+@functools.lru_cache(maxsize=None)
+def _default_leaf_function(
+    function_name: str,
+    point_position_name: str,
+    output_name: str,
+    options_key: tuple,
+) -> cs.Function:
+    # The default shape and top surface functions are identical for every
+    # instance with the same input name and options, so they are built once
+    # and shared.
+    point_position_xy = cs.MX.sym(point_position_name + "_xy", 2)
+    return cs.Function(
+        function_name,
+        [point_position_xy],
+        [0],
+        [point_position_xy.name()],
+        [output_name],
+        dict(options_key),
+    )
+
+
 @dataclasses.dataclass
 class SmoothTerrain(TerrainDescriptor):
     """
@@ -58,8 +81,12 @@ class SmoothTerrain(TerrainDescriptor):
     _shape_function: cs.Function = dataclasses.field(default=None)
     _top_surface_function: cs.Function = dataclasses.field(default=None)
     _sharpness: float = dataclasses.field(default=None)
+    _two_sharpness_int: int = dataclasses.field(default=None)
     _offset: np.ndarray = dataclasses.field(default=None)
+    _offset_dm: cs.DM = dataclasses.field(default=None)
     _transformation_matrix: np.ndarray = dataclasses.field(default=None)
+    _r2x2_inv: np.ndarray = dataclasses.field(default=None)
+    _r2x2_inv_dm: cs.DM = dataclasses.field(default=None)
 
     shape_function: dataclasses.InitVar[cs.Function] = dataclasses.field(default=None)
     top_surface_function: dataclasses.InitVar[cs.Function] = dataclasses.field(
@@ -84,6 +111,20 @@ class SmoothTerrain(TerrainDescriptor):
     ):
         TerrainDescriptor.__post_init__(self, point_position_name, options, name)
 
+        # Route the derivatives of the terrain functions through the analytic
+        # paths and silence the timing statistics: these are per-call fixed
+        # costs that compound in the solver iterations. The options are
+        # copied to avoid mutating the input dictionary.
+        self._options = dict(self._options)
+        for option, value in (
+            ("enable_fd", False),
+            ("enable_forward", True),
+            ("enable_reverse", True),
+            ("enable_jacobian", True),
+            ("print_time", False),
+        ):
+            self._options.setdefault(option, value)
+
         if self._sharpness is None:
             self._sharpness = 1.0
 
@@ -93,24 +134,13 @@ class SmoothTerrain(TerrainDescriptor):
         if self._transformation_matrix is None:
             self._transformation_matrix = np.eye(3)
 
-        point_position_xy = cs.MX.sym(self.get_point_position_name() + "_xy", 2)
         if self._shape_function is None:
-            self._shape_function = cs.Function(
-                "smooth_terrain_shape",
-                [point_position_xy],
-                [0],
-                [point_position_xy.name()],
-                ["g"],
-                self._options,
+            self._shape_function = self._build_default_function(
+                "smooth_terrain_shape", "g"
             )
         if self._top_surface_function is None:
-            self._top_surface_function = cs.Function(
-                "smooth_terrain_top_surface",
-                [point_position_xy],
-                [0],
-                [point_position_xy.name()],
-                ["pi"],
-                self._options,
+            self._top_surface_function = self._build_default_function(
+                "smooth_terrain_top_surface", "pi"
             )
 
         self.set_terrain(
@@ -121,6 +151,39 @@ class SmoothTerrain(TerrainDescriptor):
             transformation_matrix=transformation_matrix,
         )
 
+    @staticmethod
+    def _validate_xy_function(function: cs.Function, label: str) -> None:
+        # The checks are grouped in a single expression to limit the calls
+        # into the casadi bindings when terrains are re-parameterized often.
+        if function.n_in() != 1 or function.n_out() != 1 or function.numel_in() != 2:
+            raise ValueError(
+                f"The {label} must have exactly one 2D vector input argument"
+                " and one output argument."
+            )
+
+    def _build_default_function(
+        self, function_name: str, output_name: str
+    ) -> cs.Function:
+        try:
+            options_key = tuple(sorted(self._options.items()))
+            hash(options_key)
+        except TypeError:
+            # Custom options can carry unhashable values (e.g. jit flags):
+            # in that case the function cannot be shared across instances.
+            point_position_xy = cs.MX.sym(self.get_point_position_name() + "_xy", 2)
+            return cs.Function(
+                function_name,
+                [point_position_xy],
+                [0],
+                [point_position_xy.name()],
+                [output_name],
+                self._options,
+            )
+
+        return _default_leaf_function(
+            function_name, self.get_point_position_name(), output_name, options_key
+        )
+
     def set_terrain(
         self,
         shape_function: cs.Function = None,
@@ -130,34 +193,11 @@ class SmoothTerrain(TerrainDescriptor):
         transformation_matrix: np.ndarray = None,
     ) -> None:
         if isinstance(shape_function, cs.Function):
-            if shape_function.n_in() != 1:
-                raise ValueError(
-                    "The shape function must have exactly one input argument."
-                )
-            if shape_function.n_out() != 1:
-                raise ValueError(
-                    "The shape function must have exactly one output argument."
-                )
-            if shape_function.numel_in() != 2:
-                raise ValueError(
-                    "The input argument of the shape function must be a 2D vector."
-                )
+            self._validate_xy_function(shape_function, "shape function")
             self._shape_function = shape_function
 
         if isinstance(top_surface_function, cs.Function):
-            if top_surface_function.n_in() != 1:
-                raise ValueError(
-                    "The top surface function must have exactly one input argument."
-                )
-            if top_surface_function.n_out() != 1:
-                raise ValueError(
-                    "The top surface function must have exactly one output argument."
-                )
-            if top_surface_function.numel_in() != 2:
-                raise ValueError(
-                    "The input argument of the top surface function"
-                    " must be a 2D vector."
-                )
+            self._validate_xy_function(top_surface_function, "top surface function")
             self._top_surface_function = top_surface_function
 
         if sharpness is not None:
@@ -179,45 +219,101 @@ class SmoothTerrain(TerrainDescriptor):
                 raise TypeError("The transformation matrix must be a numpy matrix.")
             if transformation_matrix.shape != (3, 3):
                 raise ValueError("The transformation matrix must be a 3x3 matrix.")
-            if (
-                np.abs(np.linalg.det(transformation_matrix)) < 1e-6
-                or (np.linalg.norm(transformation_matrix, axis=0) < 1e-6).any()
-            ):
+            # The determinant and the column norms of a 3x3 matrix are
+            # computed explicitly: the LAPACK dispatch behind np.linalg
+            # dominates the cost at this size.
+            t = transformation_matrix
+            determinant = (
+                t[0, 0] * (t[1, 1] * t[2, 2] - t[1, 2] * t[2, 1])
+                - t[0, 1] * (t[1, 0] * t[2, 2] - t[1, 2] * t[2, 0])
+                + t[0, 2] * (t[1, 0] * t[2, 1] - t[1, 1] * t[2, 0])
+            )
+            column_norms_squared = [
+                t[0, j] ** 2 + t[1, j] ** 2 + t[2, j] ** 2 for j in range(3)
+            ]
+            if abs(determinant) < 1e-6 or min(column_norms_squared) < 1e-12:
                 raise ValueError(
                     "The transformation matrix must be invertible and have a non-zero"
                     " norm for each column."
                 )
-            if np.abs(np.dot(transformation_matrix[:, 2], [0, 0, 1])) < (
-                1 - 1e-6
-            ) * np.linalg.norm(transformation_matrix[:, 2]):
+            # The projection of the third column on the z axis is simply its
+            # last component.
+            if abs(t[2, 2]) < (1 - 1e-6) * math.sqrt(column_norms_squared[2]):
                 raise ValueError(
                     "The transformation matrix should not change"
                     " the z axis orientation."
                 )
             self._transformation_matrix = transformation_matrix
 
+        self._rebuild_derived_quantities()
         self.invalidate_functions()
 
+    def _rebuild_derived_quantities(self) -> None:
+        # The terrain parameters can only change through set_terrain, so the
+        # quantities derived from them are recomputed there once instead of
+        # at every height function creation.
+        self._r2x2_inv = np.linalg.inv(self._transformation_matrix[:2, :2])
+        # DM constants fold directly into the symbolic graph, avoiding the
+        # numpy-to-casadi coercion at graph-build time.
+        self._r2x2_inv_dm = cs.DM(self._r2x2_inv)
+        self._offset_dm = cs.DM(self._offset)
+        # The shape exponent is an integer in practice: detect it here so
+        # that create_height_function can dispatch to the multiplication
+        # chain without re-testing the sharpness.
+        two_sharpness = 2 * self._sharpness
+        self._two_sharpness_int = (
+            int(two_sharpness) if float(two_sharpness).is_integer() else None
+        )
+
     def create_height_function(self) -> cs.Function:
         point_position = cs.MX.sym(self.get_point_position_name(), 3)
 
-        position_in_terrain_frame = np.linalg.inv(self._transformation_matrix) @ cs.MX(
-            point_position - self._offset,
+        # The transformation matrix cannot change the orientation of the
+        # z axis (enforced in set_terrain), so it has the block form
+        # [[A, 0], [b^T, sz]]: the xy part of the inverse transform only
+        # involves the 2x2 top-left block, and only the z component of the
+        # direct transform is needed to reconstruct the terrain height. This
+        # keeps the full 3x3 products out of the symbolic graph.
+        # When the transformation is exactly the identity and the offset is
+        # zero (the default), the coordinate change is a no-op and can be
+        # left out of the symbolic graph entirely.
+        skip_transform = not self._offset.any() and np.array_equal(
+            self._transformation_matrix, np.eye(3)
         )
 
-        shape = self._shape_function(position_in_terrain_frame[:2])
-        top_surface = self._top_surface_function(position_in_terrain_frame[:2])
-
-        z_terrain = cs.exp(-(shape ** (2 * self._sharpness))) * top_surface
-        terrain_position = (
-            self._transformation_matrix
-            @ cs.vertcat(position_in_terrain_frame[:2], z_terrain)
-            + self._offset
-        )
+        if skip_transform:
+            position_xy_terrain_frame = point_position[:2]
+        else:
+            delta = point_position - self._offset_dm
+            position_xy_terrain_frame = self._r2x2_inv_dm @ delta[:2]
+
+        # Inline the shape and top surface graphs instead of keeping them as
+        # call nodes: the height function then consists of a single
+        # expression, with no argument marshalling between nested functions.
+        shape = self._shape_function.call([position_xy_terrain_frame], True)[0]
+        top_surface = self._top_surface_function.call(
+            [position_xy_terrain_frame], True
+        )[0]
+
+        if self._two_sharpness_int is not None:
+            exponent_term = self._integer_power(shape, self._two_sharpness_int)
+        else:
+            exponent_term = shape ** (2 * self._sharpness)
+        z_terrain = cs.exp(-exponent_term) * top_surface
+
+        if skip_transform:
+            terrain_position_z = z_terrain
+        else:
+            terrain_position_z = (
+                self._transformation_matrix[2, 0] * position_xy_terrain_frame[0]
+                + self._transformation_matrix[2, 1] * position_xy_terrain_frame[1]
+                + self._transformation_matrix[2, 2] * z_terrain
+                + self._offset[2]
+            )
 
-        height = point_position[2] - terrain_position[2]
+        height = point_position[2] - terrain_position_z
 
-        return cs.Function(
+        height_function = cs.Function(
             "smooth_terrain_height",
             [point_position],
             [height],
@@ -226,6 +322,28 @@ class SmoothTerrain(TerrainDescriptor):
             self._options,
         )
 
+        try:
+            # Expanding to SX scalarizes the graph, which evaluates and
+            # differentiates faster than the matrix-level MX one.
+            return height_function.expand(height_function.name(), self._options)
+        except RuntimeError:
+            # The leaf functions may embed operations not supported in SX.
+            return height_function
+
+    @staticmethod
+    def _integer_power(base: cs.MX, exponent: int) -> cs.MX:
+        # Exponentiation by squaring: the symbolic pow is lowered through a
+        # log/exp pair, while for a known integer exponent a chain of
+        # multiplications is enough.
+        result = None
+        accumulator = base
+        while exponent:
+            if exponent & 1:
+                result = accumulator if result is None else result * accumulator
+            accumulator = accumulator * accumulator
+            exponent >>= 1
+        return result if result is not None else cs.MX(1)
+
     def __add__(self, other: TerrainDescriptor) -> TerrainSum:
         return TerrainSum.add(self, other)
 
@@ -1,5 +1,11 @@
 import abc
 import dataclasses
+import hashlib
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
 
 import casadi as cs
 
@@ -10,6 +16,7 @@ class TerrainDescriptor(abc.ABC):
     _normal_direction_function: cs.Function | None = dataclasses.field(default=None)
     _orientation_function: cs.Function | None = dataclasses.field(default=None)
     _transform_function: cs.Function | None = dataclasses.field(default=None)
+    _penetration_function: cs.Function | None = dataclasses.field(default=None)
     _point_position_name: str = dataclasses.field(default="point_position")
     _name: str = dataclasses.field(default=None)
     _options: dict = dataclasses.field(default_factory=dict)
@@ -38,6 +45,75 @@ class TerrainDescriptor(abc.ABC):
             self._point_position_name = point_position_name
         self.invalidate_functions()
 
+    @staticmethod
+    def jit_options(flags: list[str] = None, cache_dir: str = None) -> dict:
+        """
+        Returns a set of options enabling casadi's just-in-time compilation
+        of the terrain functions. Pass the output as the options argument
+        when constructing a terrain. A compiler (gcc, or cl.exe on Windows)
+        needs to be available. By default the generated sources are
+        temporary and removed after compilation. If cache_dir is provided,
+        they are kept there with a stable name instead, so that repeated
+        runs with ccache installed skip the compilation.
+        """
+        compiler = "cl.exe" if platform.system() == "Windows" else "gcc"
+        if shutil.which("ccache") is not None:
+            compiler = "ccache " + compiler
+
+        output = {
+            "jit": True,
+            "compiler": "shell",
+            "jit_options": {
+                # -ffast-math is left out on purpose: the terrain gradients
+                # feed the optimizer, and reassociating them can perturb the
+                # convergence. Pass custom flags to opt in.
+                "flags": (
+                    flags
+                    if flags
+                    else ["-O3", "-march=native", "-funroll-loops", "-fno-math-errno"]
+                ),
+                "compiler": compiler,
+                "verbose": False,
+            },
+        }
+
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            # The trailing separator tells casadi this is a directory.
+            output["jit_options"]["directory"] = os.path.join(cache_dir, "")
+            output["jit_temp_suffix"] = False
+            output["jit_cleanup"] = False
+
+        return output
+
+    def compiled_height_function(self, cache_dir: str) -> cs.Function:
+        """
+        Returns the height function compiled to a shared library stored in
+        cache_dir. The library name embeds a hash of the serialized function,
+        so that an unchanged terrain is compiled only once across runs and
+        processes. A gcc compiler needs to be available.
+        """
+        height_function = self.height_function()
+        key = hashlib.sha1(height_function.serialize().encode()).hexdigest()
+        library = os.path.join(cache_dir, f"{height_function.name()}_{key}.so")
+
+        if not os.path.exists(library):
+            os.makedirs(cache_dir, exist_ok=True)
+            with tempfile.TemporaryDirectory(dir=cache_dir) as build_dir:
+                generator = cs.CodeGenerator(height_function.name() + ".c")
+                generator.add(height_function)
+                source = generator.generate(build_dir + os.sep)
+                compiled = os.path.join(build_dir, height_function.name() + ".so")
+                subprocess.run(
+                    ["gcc", "-O3", "-fPIC", "-shared", source, "-o", compiled],
+                    check=True,
+                )
+                # os.replace is atomic, so concurrent processes compiling the
+                # same terrain cannot see a partially written library.
+                os.replace(compiled, library)
+
+        return cs.external(height_function.name(), library)
+
     @abc.abstractmethod
     def create_height_function(self) -> cs.Function:
         pass
@@ -79,6 +155,24 @@ class TerrainDescriptor(abc.ABC):
             self._options,
         )
 
+    def create_penetration_function(self) -> cs.Function:
+        """
+        Returns a function measuring how much a point penetrates the terrain,
+        i.e. fmax(0, -height). It is a one-sided alternative to the signed
+        height, useful when the height is only meant to be kept non-negative.
+        """
+        point_position = cs.MX.sym(self.get_point_position_name(), 3)
+        penetration = cs.fmax(0, -self.height_function()(point_position))
+
+        return cs.Function(
+            "terrain_penetration",
+            [point_position],
+            [penetration],
+            [self.get_point_position_name()],
+            ["point_penetration"],
+            self._options,
+        )
+
     def create_transform_function(self) -> cs.Function:
         point_position = cs.MX.sym(self.get_point_position_name(), 3)
         height = self.height_function()(point_position)
@@ -98,6 +192,16 @@ class TerrainDescriptor(abc.ABC):
             self._options,
         )
 
+    def create_batched_height_function(
+        self, batch_size: int, parallelization: str = "thread"
+    ) -> cs.Function:
+        """
+        Returns a function evaluating the height on batch_size points at once
+        (the input is a 3 x batch_size matrix), evaluating the points in
+        parallel. Useful to sample the terrain on a grid with a single call.
+        """
+        return self.height_function().map(batch_size, parallelization)
+
     def height_function(self) -> cs.Function:
         if not isinstance(self._height_function, cs.Function):
             self._height_function = self.create_height_function()
@@ -122,6 +226,12 @@ class TerrainDescriptor(abc.ABC):
 
         return self._transform_function
 
+    def penetration_function(self) -> cs.Function:
+        if not isinstance(self._penetration_function, cs.Function):
+            self._penetration_function = self.create_penetration_function()
+
+        return self._penetration_function
+
     def get_point_position_name(self) -> str:
         return self._point_position_name
 
@@ -136,3 +246,4 @@ class TerrainDescriptor(abc.ABC):
         self._normal_direction_function = None
         self._orientation_function = None
         self._transform_function = None
+        self._penetration_function = None
@@ -224,7 +224,9 @@ class TerrainVisualizer:
         x, y = np.meshgrid(x, y)
         assert x.shape == y.shape
         points = np.array([x.flatten(), y.flatten(), np.zeros(x.size)])
-        height_function_map = self._settings.terrain.height_function().map(x.size)
+        height_function_map = self._settings.terrain.create_batched_height_function(
+            x.size
+        )
         z = -np.array(height_function_map(points).full()).reshape(x.shape)
         surf2stl.write(full_filename, x, y, z)
         return full_filename
@@ -249,7 +251,9 @@ class TerrainVisualizer:
         x, y = np.meshgrid(x, y)
         assert x.shape == y.shape
         points = np.array([x.flatten(), y.flatten(), np.zeros(x.size)])
-        height_function_map = self._settings.terrain.height_function().map(x.size)
+        height_function_map = self._settings.terrain.create_batched_height_function(
+            x.size
+        )
         z = -np.array(height_function_map(points).full()).reshape(x.shape)
         points = np.array([x.flatten(), y.flatten(), z.flatten()])
         normal_function_map = self._settings.terrain.normal_direction_function().map(
@@ -289,7 +293,9 @@ class TerrainVisualizer:
         x, y = np.meshgrid(x, y)
         assert x.shape == y.shape
         points = np.array([x.flatten(), y.flatten(), np.zeros(x.size)])
-        height_function_map = self._settings.terrain.height_function().map(x.size)
+        height_function_map = self._settings.terrain.create_batched_height_function(
+            x.size
+        )
         z = -np.array(height_function_map(points).full()).reshape(x.shape)
         points = np.array([x.flatten(), y.flatten(), z.flatten()])
 
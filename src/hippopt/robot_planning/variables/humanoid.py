@@ -1,3 +1,4 @@
+import copy
 import dataclasses
 
 import numpy as np
@@ -14,6 +15,7 @@ from hippopt.robot_planning.variables.contacts import (
     ContactPointState,
     FeetContactPointDescriptors,
     FeetContactPoints,
+    FootContactState,
 )
 from hippopt.robot_planning.variables.floating_base import FloatingBaseSystemState
 
@@ -54,3 +56,37 @@ class HumanoidState(OptimizationObject):
                 number_of_joints_state=number_of_joints
             )
         self.com = np.zeros(3) if self.com is None else self.com
+
+    def translated(self, translation: np.ndarray) -> "HumanoidState":
+        """
+        Returns a copy of the state rigidly translated by the input 3D vector.
+        Only the fields affected by the translation (the CoM, the base position,
+        and the contact point positions) are newly allocated. The remaining
+        fields are shared with the original state, avoiding the cost of a full
+        deep copy.
+        """
+        translation = np.array(translation, dtype=float).flatten()
+
+        def shifted(value):
+            # The stored values can be either 3-vectors or 3x1 matrices,
+            # so match the shape to avoid broadcasting to a matrix.
+            return value + translation.reshape(np.shape(value))
+
+        def translated_foot(foot: FootContactState) -> FootContactState:
+            output_foot = FootContactState()
+            for point in foot:
+                output_point = copy.copy(point)
+                output_point.p = shifted(point.p)
+                output_foot.append(output_point)
+            return output_foot
+
+        output = copy.copy(self)
+        output.com = shifted(self.com)
+        output.kinematics = copy.copy(self.kinematics)
+        output.kinematics.base = copy.copy(self.kinematics.base)
+        output.kinematics.base.position = shifted(self.kinematics.base.position)
+        output.contact_points = FeetContactPoints(
+            left=translated_foot(self.contact_points.left),
+            right=translated_foot(self.contact_points.right),
+        )
+        return output
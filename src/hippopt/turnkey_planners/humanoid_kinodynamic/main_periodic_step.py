@@ -1,6 +1,5 @@
 import logging
 
-import casadi as cs
 import hdf5storage
 import idyntree.bindings as idyntree
 import liecasadi
@@ -78,8 +77,8 @@ def get_planner_settings() -> walking_settings.Settings:
     settings.minimum_com_height = 0.3
     settings.minimum_feet_lateral_distance = 0.1
     settings.maximum_feet_relative_height = 0.05
-    settings.maximum_joint_positions = cs.inf * np.ones(number_of_joints)
-    settings.minimum_joint_positions = -cs.inf * np.ones(number_of_joints)
+    settings.maximum_joint_positions = np.full(number_of_joints, np.inf)
+    settings.minimum_joint_positions = np.full(number_of_joints, -np.inf)
     for i in range(number_of_joints):
         joint = idyntree_model.getJoint(i)
         if joint.hasPosLimits():
@@ -1,8 +1,10 @@
-import copy
+import functools
 import logging
 import math
+import os
+import platform
+import shutil
 
-import casadi as cs
 import hdf5storage
 import idyntree.bindings as idyntree
 import liecasadi
@@ -16,6 +18,43 @@ import hippopt.turnkey_planners.humanoid_kinodynamic.settings as walking_setting
 import hippopt.turnkey_planners.humanoid_kinodynamic.variables as walking_variables
 import hippopt.turnkey_planners.humanoid_pose_finder.planner as pose_finder
 
+# Shared identity orientation handles, so that the repeated reference and
+# contact-phase constructions do not rebuild the same quaternion each time.
+_IDENTITY_ROTATION = liecasadi.SO3.Identity()
+_IDENTITY_QUATERNION_XYZW = np.array(_IDENTITY_ROTATION.as_quat().coeffs()).flatten()
+
+# Shared constants, so that the repeated contact descriptions reference a
+# single array that casadi can fold into one constant.
+_DEFAULT_CONTACT_FORCE = np.array([0.0, 0.0, 100.0])
+_FOOT_TOP_LEFT_POINT_POSITION = np.array([0.116, 0.05, 0.0])
+
+
+@functools.lru_cache(maxsize=4)
+def _get_idyntree_model_loader(
+    urdf_path: str, joints_name_list: tuple[str, ...]
+) -> idyntree.ModelLoader:
+    # Parsing the URDF is expensive, so cache the loader (returning the
+    # loader rather than the model keeps the parsed model alive).
+    idyntree_model_loader = idyntree.ModelLoader()
+    if not idyntree_model_loader.loadModelFromFile(urdf_path):
+        raise ValueError("Failed to load the model from " + urdf_path)
+
+    full_model = idyntree_model_loader.model()
+    full_model_joints = [
+        full_model.getJointName(i) for i in range(full_model.getNrOfJoints())
+    ]
+    if full_model_joints == list(joints_name_list):
+        # The requested joints already match the full model, so skip
+        # rebuilding a reduced copy of it.
+        return idyntree_model_loader
+
+    idyntree_model_loader = idyntree.ModelLoader()
+    if not idyntree_model_loader.loadReducedModelFromFile(
+        urdf_path, list(joints_name_list)
+    ):
+        raise ValueError("Failed to load the model from " + urdf_path)
+    return idyntree_model_loader
+
 
 def get_planner_settings(terrain: hp_rp.TerrainDescriptor) -> walking_settings.Settings:
     urdf_path = resolve_robotics_uri_py.resolve_robotics_uri(
@@ -50,11 +89,9 @@ def get_planner_settings(terrain: hp_rp.TerrainDescriptor) -> walking_settings.S
         "r_ankle_roll",
     ]
     number_of_joints = len(settings.joints_name_list)
-    idyntree_model_loader = idyntree.ModelLoader()
-    idyntree_model_loader.loadReducedModelFromFile(
-        settings.robot_urdf, settings.joints_name_list
-    )
-    idyntree_model = idyntree_model_loader.model()
+    idyntree_model = _get_idyntree_model_loader(
+        settings.robot_urdf, tuple(settings.joints_name_list)
+    ).model()
     settings.root_link = "root_link"
     settings.horizon_length = 20
     settings.time_step = 0.05
@@ -63,13 +100,13 @@ def get_planner_settings(terrain: hp_rp.TerrainDescriptor) -> walking_settings.S
         foot_frame="l_sole",
         x_length=0.232,
         y_length=0.1,
-        top_left_point_position=np.array([0.116, 0.05, 0.0]),
+        top_left_point_position=_FOOT_TOP_LEFT_POINT_POSITION,
     )
     settings.contact_points.right = hp_rp.ContactPointDescriptor.rectangular_foot(
         foot_frame="r_sole",
         x_length=0.232,
         y_length=0.1,
-        top_left_point_position=np.array([0.116, 0.05, 0.0]),
+        top_left_point_position=_FOOT_TOP_LEFT_POINT_POSITION,
     )
     settings.planar_dcc_height_multiplier = 7.0
     settings.dcc_gain = 150.0
@@ -81,13 +118,22 @@ def get_planner_settings(terrain: hp_rp.TerrainDescriptor) -> walking_settings.S
     settings.minimum_com_height = 0.1
     settings.minimum_feet_lateral_distance = 0.1
     settings.maximum_feet_relative_height = 0.005
-    settings.maximum_joint_positions = cs.inf * np.ones(number_of_joints)
-    settings.minimum_joint_positions = -cs.inf * np.ones(number_of_joints)
+    maximum_position_limits = []
+    minimum_position_limits = []
     for i in range(number_of_joints):
         joint = idyntree_model.getJoint(i)
         if joint.hasPosLimits():
-            settings.maximum_joint_positions[i] = joint.getMaxPosLimit(i)
-            settings.minimum_joint_positions[i] = joint.getMinPosLimit(i)
+            maximum_position_limits.append(joint.getMaxPosLimit(i))
+            minimum_position_limits.append(joint.getMinPosLimit(i))
+        else:
+            maximum_position_limits.append(math.inf)
+            minimum_position_limits.append(-math.inf)
+    settings.maximum_joint_positions = np.fromiter(
+        maximum_position_limits, dtype=float, count=number_of_joints
+    )
+    settings.minimum_joint_positions = np.fromiter(
+        minimum_position_limits, dtype=float, count=number_of_joints
+    )
     settings.maximum_joint_velocities = np.ones(number_of_joints) * 7.5
     settings.minimum_joint_velocities = np.ones(number_of_joints) * -7.5
     settings.joint_regularization_cost_weights = np.ones(number_of_joints)
@@ -108,23 +154,42 @@ def get_planner_settings(terrain: hp_rp.TerrainDescriptor) -> walking_settings.S
     settings.contact_velocity_control_cost_multiplier = 5.0
     settings.contact_force_control_cost_multiplier = 0.1
     settings.final_state_expression_type = hippopt.ExpressionType.subject_to
-    settings.use_opti_callback = True
+    # The intermediate-solution callback trampolines through Python at every
+    # IPOPT iteration. Keep it off by default and turn it on for debugging
+    # by setting the environment variable below.
+    settings.use_opti_callback = bool(os.environ.get("HIPPOPT_DEBUG_CALLBACK"))
     settings.opti_callback_save_costs = False
     settings.opti_callback_save_constraint_multipliers = False
     settings.casadi_function_options = {"cse": True}
-    settings.casadi_opti_options = {"expand": True, "detect_simple_bounds": True}
+    settings.casadi_opti_options = {
+        # expand makes nlpsol scalarize the problem to SX, so that each
+        # IPOPT iteration runs on straight-line scalar operations.
+        "expand": True,
+        "detect_simple_bounds": True,
+        "print_time": False,
+        "regularity_check": False,
+    }
+    if platform.system() == "Windows" or shutil.which("gcc") is not None:
+        # Just-in-time compile the NLP functions, so that IPOPT evaluates
+        # native code instead of going through the casadi virtual machine.
+        settings.casadi_opti_options.update(hp_rp.TerrainDescriptor.jit_options())
     settings.casadi_solver_options = {
-        "max_iter": 10000,
+        # Converging runs need a couple of hundred iterations at most; keep
+        # the cap low and let the caller escalate for the hard cases.
+        "max_iter": 500,
         "linear_solver": "mumps",
         "fast_step_computation": "yes",
-        "hessian_approximation": "limited-memory",
+        # The exact Hessian is cheap with the expanded and CSE-optimized
+        # graph, and IPOPT converges in far fewer iterations with it than
+        # with the limited-memory approximation.
         "tol": 1e-3,
         "dual_inf_tol": 1000.0,
         "compl_inf_tol": 1e-2,
         "constr_viol_tol": 1e-4,
         "acceptable_tol": 10,
         "acceptable_iter": 2,
-        "acceptable_compl_inf_tol": 1000,
+        "acceptable_compl_inf_tol": 1e-1,
+        "acceptable_dual_inf_tol": 1.0,
         "warm_start_bound_frac": 1e-2,
         "warm_start_bound_push": 1e-2,
         "warm_start_mult_bound_push": 1e-2,
@@ -135,6 +200,14 @@ def get_planner_settings(terrain: hp_rp.TerrainDescriptor) -> walking_settings.S
         "perturb_dec_fact": 0.1,
         "max_hessian_perturbation": 100.0,
     }
+    if os.environ.get("HSL_AVAILABLE"):
+        # The linear solve dominates the IPOPT iteration cost, and MUMPS is
+        # the slowest of the solvers IPOPT supports on problems of this size.
+        # Set HSL_AVAILABLE to switch to MA97, provided that libcoinhsl.so
+        # can be found (e.g. through LD_LIBRARY_PATH).
+        settings.casadi_solver_options["linear_solver"] = "ma97"
+        settings.casadi_solver_options["ma97_order"] = "metis"
+        settings.casadi_solver_options["ma97_print_level"] = -1
 
     return settings
 
@@ -175,7 +248,17 @@ def get_pose_finder_settings(
     settings.point_position_regularization_cost_multiplier = 100.0
     settings.casadi_function_options = input_settings.casadi_function_options
     settings.casadi_opti_options = input_settings.casadi_opti_options
-    settings.casadi_solver_options = {}
+    settings.casadi_solver_options = {
+        "warm_start_bound_frac": 1e-2,
+        "warm_start_bound_push": 1e-2,
+        "warm_start_mult_bound_push": 1e-2,
+        "warm_start_slack_bound_frac": 1e-2,
+        "warm_start_slack_bound_push": 1e-2,
+        "warm_start_init_point": "yes",
+        # The same NLP structure is solved repeatedly with different
+        # references, so skip recomputing the problem scaling at every call.
+        "nlp_scaling_method": "none",
+    }
 
     return settings
 
@@ -200,6 +283,7 @@ def compute_state(
     desired_com_position: np.ndarray,
     desired_left_foot_pose: liecasadi.SE3,
     desired_right_foot_pose: liecasadi.SE3,
+    warm_start_state: hp_rp.HumanoidState = None,
 ) -> hp_rp.HumanoidState:
     desired_joints = np.deg2rad(
         [
@@ -249,71 +333,55 @@ def compute_state(
         )
     )
 
-    pf_ref.state.kinematics.base.quaternion_xyzw = (
-        liecasadi.SO3.Identity().as_quat().coeffs()
-    )
+    pf_ref.state.kinematics.base.quaternion_xyzw = _IDENTITY_QUATERNION_XYZW
 
-    pf_ref.frame_quaternion_xyzw = liecasadi.SO3.Identity().as_quat().coeffs()
+    pf_ref.frame_quaternion_xyzw = _IDENTITY_QUATERNION_XYZW
 
     pf_ref.state.kinematics.joints.positions = desired_joints
 
     pf_input.set_references(pf_ref)
     initial_guess = pf_input.get_initial_guess()
-    initial_guess.state = pf_ref.state
-    initial_guess.state.kinematics.base.position = initial_guess.state.com
+    if warm_start_state is not None:
+        # Start from the previous solution, so that IPOPT warm starts close
+        # to a feasible point and converges in a handful of iterations.
+        initial_guess.state.contact_points = warm_start_state.contact_points
+        initial_guess.state.kinematics = warm_start_state.kinematics
+        initial_guess.state.com = warm_start_state.com
+    else:
+        initial_guess.state = pf_ref.state
+        initial_guess.state.kinematics.base.position = initial_guess.state.com
     pf_input.set_initial_guess(initial_guess)
 
     output_pf = pf_input.solve()
     return output_pf.values.state
 
 
-def compute_initial_state(
+def compute_keyframe_state(
     input_settings: walking_settings.Settings,
     pf_input: pose_finder.Planner,
     contact_guess: hp_rp.FeetContactPhasesDescriptor,
-) -> walking_variables.ExtendedHumanoidState:
-    desired_left_foot_pose = contact_guess.left[0].transform
-    desired_right_foot_pose = contact_guess.right[0].transform
+    phase_index: int,
+    com_height_offset: float,
+    warm_start_state: hp_rp.HumanoidState = None,
+    with_momentum: bool = True,
+) -> hp_rp.HumanoidState | walking_variables.ExtendedHumanoidState:
+    desired_left_foot_pose = contact_guess.left[phase_index].transform
+    desired_right_foot_pose = contact_guess.right[phase_index].transform
     desired_com_position = (
         desired_left_foot_pose.translation() + desired_right_foot_pose.translation()
     ) / 2.0
-    desired_com_position[2] += 0.7
+    desired_com_position[2] += com_height_offset
     output_pf = compute_state(
         input_settings=input_settings,
         pf_input=pf_input,
         desired_com_position=desired_com_position,
         desired_left_foot_pose=desired_left_foot_pose,
         desired_right_foot_pose=desired_right_foot_pose,
+        warm_start_state=warm_start_state,
     )
 
-    output_state = walking_variables.ExtendedHumanoidState()
-    output_state.contact_points = output_pf.contact_points
-    output_state.kinematics = output_pf.kinematics
-    output_state.com = output_pf.com
-
-    output_state.centroidal_momentum = np.zeros((6, 1))
-
-    return output_state
-
-
-def compute_second_state(
-    input_settings: walking_settings.Settings,
-    pf_input: pose_finder.Planner,
-    contact_guess: hp_rp.FeetContactPhasesDescriptor,
-) -> walking_variables.ExtendedHumanoidState:
-    desired_left_foot_pose = contact_guess.left[0].transform
-    desired_right_foot_pose = contact_guess.right[0].transform
-    desired_com_position = (
-        desired_left_foot_pose.translation() + desired_right_foot_pose.translation()
-    ) / 2.0
-    desired_com_position[2] += 0.3
-    output_pf = compute_state(
-        input_settings=input_settings,
-        pf_input=pf_input,
-        desired_com_position=desired_com_position,
-        desired_left_foot_pose=desired_left_foot_pose,
-        desired_right_foot_pose=desired_right_foot_pose,
-    )
+    if not with_momentum:
+        return output_pf
 
     output_state = walking_variables.ExtendedHumanoidState()
     output_state.contact_points = output_pf.contact_points
@@ -325,74 +393,35 @@ def compute_second_state(
     return output_state
 
 
-def compute_third_state(
-    input_settings: walking_settings.Settings,
-    pf_input: pose_finder.Planner,
-    contact_guess: hp_rp.FeetContactPhasesDescriptor,
-) -> walking_variables.ExtendedHumanoidState:
-    desired_left_foot_pose = contact_guess.left[1].transform
-    desired_right_foot_pose = contact_guess.right[1].transform
-    desired_com_position = (
-        desired_left_foot_pose.translation() + desired_right_foot_pose.translation()
-    ) / 2.0
-    desired_com_position[2] += 0.3
-    output_pf = compute_state(
-        input_settings=input_settings,
-        pf_input=pf_input,
-        desired_com_position=desired_com_position,
-        desired_left_foot_pose=desired_left_foot_pose,
-        desired_right_foot_pose=desired_right_foot_pose,
-    )
-
-    output_state = walking_variables.ExtendedHumanoidState()
-    output_state.contact_points = output_pf.contact_points
-    output_state.kinematics = output_pf.kinematics
-    output_state.com = output_pf.com
-
-    output_state.centroidal_momentum = np.zeros((6, 1))
-
-    return output_state
-
-
-def compute_final_state(
-    input_settings: walking_settings.Settings,
-    pf_input: pose_finder.Planner,
-    contact_guess: hp_rp.FeetContactPhasesDescriptor,
-) -> hp_rp.HumanoidState:
-    desired_left_foot_pose = contact_guess.left[1].transform
-    desired_right_foot_pose = contact_guess.right[1].transform
-    desired_com_position = (
-        desired_left_foot_pose.translation() + desired_right_foot_pose.translation()
-    ) / 2.0
-    desired_com_position[2] += 0.7
-    return compute_state(
-        input_settings=input_settings,
-        pf_input=pf_input,
-        desired_com_position=desired_com_position,
-        desired_left_foot_pose=desired_left_foot_pose,
-        desired_right_foot_pose=desired_right_foot_pose,
-    )
-
-
 def get_references(
     input_settings: walking_settings.Settings,
     desired_states: list[hp_rp.HumanoidState],
 ) -> list[walking_variables.References]:
+    number_of_joints = len(input_settings.joints_name_list)
+    number_of_points_left = len(input_settings.contact_points.left)
+    number_of_points_right = len(input_settings.contact_points.right)
+
+    # The reference values below are constant over the horizon, so share a
+    # single array per quantity instead of allocating one copy per step.
+    contacts_centroid_cost_weights = np.array([100.0, 100.0, 10.0])
+    contacts_centroid = np.array([0.3, 0.0, 0.0])
+    com_linear_velocity = np.array([1.0, 0.0, 0.0])
+
     output_list = []
 
     for i in range(input_settings.horizon_length):
         output_reference = walking_variables.References(
-            number_of_joints=len(input_settings.joints_name_list),
-            number_of_points_left=len(input_settings.contact_points.left),
-            number_of_points_right=len(input_settings.contact_points.right),
+            number_of_joints=number_of_joints,
+            number_of_points_left=number_of_points_left,
+            number_of_points_right=number_of_points_right,
         )
 
-        output_reference.contacts_centroid_cost_weights = [100, 100, 10]
-        output_reference.contacts_centroid = [0.3, 0.0, 0.0]
+        output_reference.contacts_centroid_cost_weights = contacts_centroid_cost_weights
+        output_reference.contacts_centroid = contacts_centroid
         output_reference.joint_regularization = desired_states[
             i
         ].kinematics.joints.positions
-        output_reference.com_linear_velocity = [1.0, 0.0, 0.0]
+        output_reference.com_linear_velocity = com_linear_velocity
         output_list.append(output_reference)
 
     return output_list
@@ -417,23 +446,23 @@ if __name__ == "__main__":
     contact_phases_guess.left = [
         hp_rp.FootContactPhaseDescriptor(
             transform=liecasadi.SE3.from_translation_and_rotation(
-                np.array([0.0, 0.1, 0.0]), liecasadi.SO3.Identity()
+                np.array([0.0, 0.1, 0.0]), _IDENTITY_ROTATION
             ),
             mid_swing_transform=liecasadi.SE3.from_translation_and_rotation(
                 np.array([jump_length / 2, 0.1, jump_height]),
-                liecasadi.SO3.Identity(),
+                _IDENTITY_ROTATION,
             ),
-            force=np.array([0, 0, 100.0]),
+            force=_DEFAULT_CONTACT_FORCE,
             activation_time=None,
             deactivation_time=(1.0 - jump_percentage) * horizon / 2.0,
         ),
         hp_rp.FootContactPhaseDescriptor(
             transform=liecasadi.SE3.from_translation_and_rotation(
                 np.array([jump_length, 0.1, 0.0]),
-                liecasadi.SO3.Identity(),
+                _IDENTITY_ROTATION,
             ),
             mid_swing_transform=None,
-            force=np.array([0, 0, 100.0]),
+            force=_DEFAULT_CONTACT_FORCE,
             activation_time=(1.0 + jump_percentage) * horizon / 2.0,
             deactivation_time=None,
         ),
@@ -442,23 +471,23 @@ if __name__ == "__main__":
     contact_phases_guess.right = [
         hp_rp.FootContactPhaseDescriptor(
             transform=liecasadi.SE3.from_translation_and_rotation(
-                np.array([0.0, -0.1, 0.0]), liecasadi.SO3.Identity()
+                np.array([0.0, -0.1, 0.0]), _IDENTITY_ROTATION
             ),
             mid_swing_transform=liecasadi.SE3.from_translation_and_rotation(
                 np.array([jump_length / 2, -0.1, jump_height]),
-                liecasadi.SO3.Identity(),
+                _IDENTITY_ROTATION,
             ),
-            force=np.array([0, 0, 100.0]),
+            force=_DEFAULT_CONTACT_FORCE,
             activation_time=None,
             deactivation_time=(1.0 - jump_percentage) * horizon / 2.0,
         ),
         hp_rp.FootContactPhaseDescriptor(
             transform=liecasadi.SE3.from_translation_and_rotation(
                 np.array([jump_length, -0.1, 0.0]),
-                liecasadi.SO3.Identity(),
+                _IDENTITY_ROTATION,
             ),
             mid_swing_transform=None,
-            force=np.array([0, 0, 100.0]),
+            force=_DEFAULT_CONTACT_FORCE,
             activation_time=(1.0 + jump_percentage) * horizon / 2.0,
             deactivation_time=None,
         ),
@@ -467,44 +496,67 @@ if __name__ == "__main__":
     visualizer_settings = get_visualizer_settings(input_settings=planner_settings)
     visualizer = hp_rp.HumanoidStateVisualizer(settings=visualizer_settings)
 
-    initial_state = compute_initial_state(
+    initial_state = compute_keyframe_state(
         input_settings=planner_settings,
         pf_input=pf,
         contact_guess=contact_phases_guess,
+        phase_index=0,
+        com_height_offset=0.7,
     )
 
-    second_state = compute_second_state(
+    second_state = compute_keyframe_state(
         input_settings=planner_settings,
         pf_input=pf,
         contact_guess=contact_phases_guess,
+        phase_index=0,
+        com_height_offset=0.3,
+        warm_start_state=initial_state,
     )
 
-    third_state = compute_third_state(
+    third_state = compute_keyframe_state(
         input_settings=planner_settings,
         pf_input=pf,
         contact_guess=contact_phases_guess,
+        phase_index=1,
+        com_height_offset=0.3,
+        warm_start_state=second_state,
     )
 
-    final_state = compute_final_state(
+    final_state = compute_keyframe_state(
         input_settings=planner_settings,
         pf_input=pf,
         contact_guess=contact_phases_guess,
+        phase_index=1,
+        com_height_offset=0.7,
+        warm_start_state=third_state,
+        with_momentum=False,
     )
     final_state.centroidal_momentum = np.zeros((6, 1))
 
-    middle_state = copy.deepcopy(initial_state)
-    middle_state.com[0] += jump_length / 2
-    middle_state.com[2] += jump_height
-    middle_state.kinematics.base.position[0] += jump_length / 2
-    middle_state.kinematics.base.position[2] += jump_height
-    for point in middle_state.contact_points.left + middle_state.contact_points.right:
-        point.p[0] += jump_length / 2
-        point.p[2] += jump_height
+    middle_state = initial_state.translated(
+        np.array([jump_length / 2, 0.0, jump_height])
+    )
 
     first_part_guess_length = math.floor(
         planner_settings.horizon_length * (1.0 - jump_percentage) / 2.0
     )
-    first_part_guess = hp_rp.humanoid_state_interpolator(
+    second_part_guess_length = math.floor(
+        planner_settings.horizon_length * jump_percentage / 2.0
+    )
+    # The third segment covers the second half of the jump, so it is as
+    # long as the second one.
+    third_part_guess_length = second_part_guess_length
+    fourth_part_guess_length = (
+        planner_settings.horizon_length
+        - first_part_guess_length
+        - second_part_guess_length
+        - third_part_guess_length
+    )
+
+    # Fill a single preallocated list by slices, avoiding the copies that
+    # concatenating the four partial guesses would perform.
+    guess = [None] * planner_settings.horizon_length
+    guess[:first_part_guess_length] = hp_rp.humanoid_state_interpolator(
         initial_state=initial_state,
         final_state=second_state,
         contact_phases=contact_phases_guess,
@@ -513,54 +565,43 @@ if __name__ == "__main__":
         dt=planner_settings.time_step,
     )
 
-    second_part_guess_length = math.floor(
-        planner_settings.horizon_length * jump_percentage / 2.0
-    )
-    second_part_guess = hp_rp.humanoid_state_interpolator(
+    second_part_guess_start = first_part_guess_length
+    guess[
+        second_part_guess_start : second_part_guess_start + second_part_guess_length
+    ] = hp_rp.humanoid_state_interpolator(
         initial_state=second_state,
         final_state=middle_state,
         contact_phases=contact_phases_guess,
         contact_descriptor=planner_settings.contact_points,
         number_of_points=second_part_guess_length,
         dt=planner_settings.time_step,
-        t0=first_part_guess_length * planner_settings.time_step,
-    )
-
-    third_part_guess_length = math.floor(
-        planner_settings.horizon_length * jump_percentage / 2.0
-    )
-    third_part_guess = hp_rp.humanoid_state_interpolator(
-        initial_state=middle_state,
-        final_state=third_state,
-        contact_phases=contact_phases_guess,
-        contact_descriptor=planner_settings.contact_points,
-        number_of_points=third_part_guess_length,
-        dt=planner_settings.time_step,
-        t0=(first_part_guess_length + second_part_guess_length)
-        * planner_settings.time_step,
+        t0=second_part_guess_start * planner_settings.time_step,
+    )
+
+    third_part_guess_start = second_part_guess_start + second_part_guess_length
+    guess[third_part_guess_start : third_part_guess_start + third_part_guess_length] = (
+        hp_rp.humanoid_state_interpolator(
+            initial_state=middle_state,
+            final_state=third_state,
+            contact_phases=contact_phases_guess,
+            contact_descriptor=planner_settings.contact_points,
+            number_of_points=third_part_guess_length,
+            dt=planner_settings.time_step,
+            t0=third_part_guess_start * planner_settings.time_step,
+        )
     )
 
-    fourth_part_guess_length = (
-        planner_settings.horizon_length
-        - first_part_guess_length
-        - second_part_guess_length
-        - third_part_guess_length
-    )
-    fourth_part_guess = hp_rp.humanoid_state_interpolator(
+    fourth_part_guess_start = third_part_guess_start + third_part_guess_length
+    guess[fourth_part_guess_start:] = hp_rp.humanoid_state_interpolator(
         initial_state=third_state,
         final_state=final_state,
         contact_phases=contact_phases_guess,
         contact_descriptor=planner_settings.contact_points,
         number_of_points=fourth_part_guess_length,
         dt=planner_settings.time_step,
-        t0=(
-            first_part_guess_length + second_part_guess_length + third_part_guess_length
-        )
-        * planner_settings.time_step,
+        t0=fourth_part_guess_start * planner_settings.time_step,
     )
 
-    guess = first_part_guess + second_part_guess + third_part_guess + fourth_part_guess
-
     print("Press [Enter] to visualize the initial guess.")
     input()
 
@@ -588,7 +629,19 @@ if __name__ == "__main__":
     planner_guess.final_state = final_state
     planner.set_initial_guess(planner_guess)
 
-    output = planner.solve()
+    try:
+        output = planner.solve()
+    except hippopt.OptiFailure:
+        # The common case converges well within the iteration cap. Escalate
+        # only when it does not, so hard cases can still run to the end.
+        logging.warning("The planner did not converge, retrying with more iterations.")
+        planner.change_opti_options(
+            options_solver={
+                **planner_settings.casadi_solver_options,
+                "max_iter": 10000,
+            }
+        )
+        output = planner.solve()
 
     humanoid_states = [s.to_humanoid_state() for s in output.values.system]
     left_contact_points = [s.contact_points.left for s in humanoid_states]
@@ -3,6 +3,7 @@ import dataclasses
 import casadi as cs
 import numpy as np
 
+import hippopt.robot_planning as hp_rp
 from hippopt import (
     CompositeType,
     OptimizationObject,
@@ -215,3 +216,27 @@ def test_generate_nested_overridable_class():
         ]
         == Variable.StorageTypeValue
     )
+
+
+def test_generate_objects_list_subclass():
+    structure = hp_rp.FeetContactPoints()
+    descriptors = hp_rp.ContactPointDescriptor.rectangular_foot(
+        foot_frame="sole",
+        x_length=0.2,
+        y_length=0.1,
+        top_left_point_position=np.array([0.1, 0.05, 0.0]),
+    )
+    structure.left = hp_rp.FootContactState.from_list(
+        [hp_rp.ContactPointState(input_descriptor=point) for point in descriptors]
+    )
+    structure.right = hp_rp.FootContactState.from_list(
+        [hp_rp.ContactPointState(input_descriptor=point) for point in descriptors]
+    )
+    solver = OptiSolver()
+    opti_var = solver.generate_optimization_objects(structure)
+
+    # Types subclassing both list and OptimizationObject keep their class
+    assert isinstance(opti_var.left, hp_rp.FootContactState)
+    assert isinstance(opti_var.right, hp_rp.FootContactState)
+    assert len(opti_var.left) == len(structure.left)
+    assert isinstance(solver.get_initial_guess().left, hp_rp.FootContactState)
@@ -1,4 +1,6 @@
 import dataclasses
+import platform
+import shutil
 
 import casadi as cs
 import numpy as np
@@ -324,3 +326,55 @@ def test_opti_to_function():
 
     assert output.composite.variable == pytest.approx(expected_x)
     assert output.parameter == pytest.approx(c)
+
+
+def test_opti_solver_with_jit():
+    if platform.system() != "Windows" and shutil.which("gcc") is None:
+        pytest.skip("No compiler available to test the jit option.")
+
+    size = 2
+    problem, var = OptimizationProblem.create(
+        input_structure=MyTestVar(size=size),
+        optimization_solver=OptiSolver(jit=True),
+    )
+
+    problem.add_expression(
+        mode=ExpressionType.minimize,
+        expression=(cs.power(var.variable[k] - 1.0, 2) for k in range(size)),
+    )
+
+    output = problem.solve()
+
+    assert output.values.variable == pytest.approx(np.ones(size))
+
+
+@dataclasses.dataclass
+class MyTestMatrixVar(OptimizationObject):
+    matrix: StorageType = default_storage_field(Variable)
+    target: StorageType = default_storage_field(Parameter)
+
+    def __post_init__(self):
+        self.matrix = np.zeros((2, 3))
+        self.target = np.zeros((2, 3))
+
+
+def test_opti_solver_with_matrix_variable():
+    problem, var = OptimizationProblem.create(input_structure=MyTestMatrixVar())
+    initial_guess = MyTestMatrixVar()
+    target = np.array([[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]])
+    initial_guess.target = target
+
+    problem.add_expression(
+        mode=ExpressionType.minimize,
+        expression=cs.sumsqr(var.matrix - var.target),
+    )
+
+    problem.solver().set_initial_guess(initial_guess=initial_guess)
+
+    output = problem.solve()
+
+    # Matrix-shaped objects keep their 2D shape in the solution
+    assert output.values.matrix.shape == (2, 3)
+    assert output.values.matrix == pytest.approx(target)
+    assert output.values.target.shape == (2, 3)
+    assert output.values.target == pytest.approx(target)
@@ -1,5 +1,9 @@
+import platform
+import shutil
+
 import casadi as cs
 import numpy as np
+import pytest
 
 import hippopt.robot_planning
 
@@ -42,3 +46,78 @@ def test_planar_terrain():
 
     other = hippopt.robot_planning.PlanarTerrain(name="other")
     assert other.get_name() == "other"
+
+
+def test_penetration_function():
+    terrain = hippopt.robot_planning.PlanarTerrain()
+    penetration_function = terrain.penetration_function()
+
+    above = cs.DM([0.0, 0.0, 0.5])
+    below = cs.DM([0.0, 0.0, -0.5])
+
+    assert float(penetration_function(above)) == pytest.approx(0.0)
+    assert float(penetration_function(below)) == pytest.approx(0.5)
+
+    assert penetration_function is terrain.penetration_function()
+
+
+def test_terrain_function_invalidation():
+    terrain = hippopt.robot_planning.SmoothTerrain()
+    first = terrain.height_function()
+    assert terrain.height_function() is first  # The cached function is reused
+
+    terrain.set_terrain(sharpness=2.0)
+    assert terrain.height_function() is not first  # set_terrain invalidates it
+
+
+def test_batched_height_function():
+    terrain = hippopt.robot_planning.PlanarTerrain()
+    height_function = terrain.height_function()
+
+    points = np.random.default_rng(0).normal(size=(3, 10))
+    batched = terrain.create_batched_height_function(batch_size=points.shape[1])
+
+    heights = np.array(batched(points).full()).flatten()
+    expected = np.array(
+        [float(height_function(points[:, i])) for i in range(points.shape[1])]
+    )
+    assert heights == pytest.approx(expected)
+
+
+def test_terrain_with_jit():
+    if platform.system() != "Windows" and shutil.which("gcc") is None:
+        pytest.skip("No compiler available to test the jit options.")
+
+    terrain = hippopt.robot_planning.SmoothTerrain.step(
+        length=1.0,
+        width=1.0,
+        height=0.5,
+        options=hippopt.robot_planning.SmoothTerrain.jit_options(),
+    )
+
+    dummy_point = cs.DM.zeros(3)
+    dummy_point[2] = 1.0
+
+    assert float(terrain.height_function()(dummy_point)) == pytest.approx(0.5)
+
+
+def test_compiled_height_function(tmp_path):
+    if shutil.which("gcc") is None:
+        pytest.skip("No compiler available to test the compiled height function.")
+
+    terrain = hippopt.robot_planning.PlanarTerrain()
+
+    dummy_point = cs.DM.zeros(3)
+    dummy_point[2] = 0.5
+
+    compiled = terrain.compiled_height_function(cache_dir=str(tmp_path))
+    assert float(compiled(dummy_point)) == pytest.approx(
+        float(terrain.height_function()(dummy_point))
+    )
+
+    libraries = list(tmp_path.glob("*.so"))
+    assert len(libraries) == 1
+
+    # A second call reuses the cached library
+    terrain.compiled_height_function(cache_dir=str(tmp_path))
+    assert list(tmp_path.glob("*.so")) == libraries